@@ -4,10 +4,15 @@ File transfer module for handling file data chunking and validation.
 import struct
 import logging
 import base64
+import hashlib
+import os
 
 LOG = logging.getLogger(__name__)
 
 CHUNK_SIZE = 16 * 1024  # 16KB chunks to match STM32 side
+CHUNK_HEADER_SIZE = 4  # Chunk number (2 bytes) + chunk size (2 bytes)
+HEADER_MAGIC = b'\xAA\x55'
+TRAILER_MAGIC = b'\xAA\x5A'
 
 def create_chunk_validator():
     """Create a simple chunk validator function"""
@@ -15,6 +20,121 @@ def create_chunk_validator():
         return True  # Basic validation - can be enhanced with checksums
     return validate_chunk
 
+def chunk_digest(chunk_data: bytes) -> bytes:
+    """SHA-256 of a chunk's payload (without its header)"""
+    return hashlib.sha256(chunk_data).digest()
+
+class TreeHash:
+    """Whole-file digest built from per-chunk digests.
+
+    Must match the transmitter: SHA-256 over the chunk digests in chunk order,
+    so chunks can be hashed as they arrive, in any order.
+    """
+    def __init__(self, total_chunks: int):
+        self.digests = [None] * total_chunks
+        self.remaining = total_chunks
+
+    def add(self, chunk_num: int, digest: bytes):
+        if self.digests[chunk_num] is None:
+            self.remaining -= 1
+        self.digests[chunk_num] = digest
+
+    @property
+    def complete(self) -> bool:
+        return self.remaining == 0
+
+    def digest(self) -> bytes:
+        if not self.complete:
+            raise RuntimeError(f"{self.remaining} chunks not hashed yet")
+        return hashlib.sha256(b''.join(self.digests)).digest()
+
+class FileReceiver:
+    def __init__(self, out_dir: str = '.'):
+        self.out_dir = out_dir
+        self.file = None
+        self.filename = None
+        self.size = 0
+        self.total_chunks = 0
+        self.tree_hash = None
+        self.expected_digest = None
+        self.verified = None
+
+    def start(self, header: bytes):
+        """Open the output file described by a transfer header"""
+        magic, size, name_len = struct.unpack_from('>2sIB', header)
+        if magic != HEADER_MAGIC:
+            raise ValueError("Not a file transfer header")
+        filename = header[7:7 + name_len].decode('utf-8')
+
+        self.filename = os.path.basename(filename)
+        self.size = size
+        self.total_chunks = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.tree_hash = TreeHash(self.total_chunks)
+        self.expected_digest = None
+        self.verified = None
+        if self.file is not None:
+            self.file.close()
+        self.file = open(os.path.join(self.out_dir, self.filename), 'wb')
+        self.file.truncate(size)
+
+        LOG.info(f"Receiving file {self.filename} ({size} bytes, {self.total_chunks} chunks)")
+
+    def write_chunk(self, chunk: bytes):
+        """Write a chunk at its offset and hash it. Chunks may arrive in any order.
+
+        Returns the verification result once it is known, otherwise None.
+        Duplicates of chunks already written are ignored.
+        """
+        if self.tree_hash is None:
+            raise ValueError("No transfer started")
+        if self.verified is not None:
+            return self.verified
+        if len(chunk) < CHUNK_HEADER_SIZE:
+            raise ValueError("Chunk shorter than its header")
+        chunk_num, length = struct.unpack_from('>HH', chunk)
+        if chunk_num >= self.total_chunks:
+            raise ValueError(f"Chunk {chunk_num} out of range")
+        expected = min(CHUNK_SIZE, self.size - chunk_num * CHUNK_SIZE)
+        if length != expected:
+            raise ValueError(f"Chunk {chunk_num} claims {length} bytes, expected {expected}")
+        if len(chunk) < CHUNK_HEADER_SIZE + length:
+            raise ValueError(f"Chunk {chunk_num} truncated: {len(chunk) - CHUNK_HEADER_SIZE} of {length} bytes")
+        if self.tree_hash.digests[chunk_num] is not None:
+            return self._check()
+        chunk_data = memoryview(chunk)[CHUNK_HEADER_SIZE:CHUNK_HEADER_SIZE + length]
+
+        self.file.seek(chunk_num * CHUNK_SIZE)
+        self.file.write(chunk_data)
+        self.tree_hash.add(chunk_num, chunk_digest(chunk_data))
+        return self._check()
+
+    def finish(self, trailer: bytes):
+        """Record the transmitter's file digest from the trailer.
+
+        Returns the verification result once it is known, otherwise None.
+        """
+        if self.tree_hash is None:
+            raise ValueError("No transfer started")
+        magic, total_chunks, digest = struct.unpack_from('>2sH32s', trailer)
+        if magic != TRAILER_MAGIC:
+            raise ValueError("Not a file transfer trailer")
+        if total_chunks != self.total_chunks:
+            raise ValueError(f"Trailer expects {total_chunks} chunks, header gave {self.total_chunks}")
+        self.expected_digest = digest
+        return self._check()
+
+    def _check(self):
+        # Verification completes as soon as both the trailer and the last chunk are in
+        if self.verified is not None or self.expected_digest is None or not self.tree_hash.complete:
+            return self.verified
+        self.verified = self.tree_hash.digest() == self.expected_digest
+        self.file.close()
+        if self.verified:
+            LOG.info(f"File {self.filename} verified")
+        else:
+            LOG.error(f"File {self.filename} failed verification")
+        return self.verified
+
 class FileTransfer:
     def __init__(self):
         self.data = None
@@ -10,13 +10,17 @@ If --port is omitted the bridge will run in simulated mode and echo messages.
 import base64
 import argparse
 import asyncio
+import contextlib
 import json
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from aiohttp import web
 from websockets import serve
-from file_transfer import FileTransfer, create_chunk_validator
+from file_transfer import CHUNK_HEADER_SIZE, FileTransfer
+from pipeline import LOOKAHEAD, ChunkPipeline
+from progress import ProgressTracker
 
 try:
     import serial_asyncio
@@ -27,13 +31,22 @@ LOG = logging.getLogger("bridge")
 
 
 class SerialRelay:
-    def __init__(self, serial_port=None, baud=115200):
+    def __init__(self, serial_port=None, baud=115200, workers=0, lookahead=LOOKAHEAD):
         self.serial_port = serial_port
         self.baud = baud
-        self.transport = None
-        self.protocol = None
+        self.reader = None
+        self.writer = None
         self._is_connected = False
-        self.file_transfer = FileTransfer()
+        # One file on the wire at a time; frames must not interleave
+        self._send_lock = asyncio.Lock()
+        # Chunk preparation runs on worker processes if requested,
+        # otherwise on the loop's default thread pool
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.lookahead = lookahead
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
 
     async def test_connection(self):
         """Test if we can connect to the STM32 device and verify it's an STM32."""
@@ -46,7 +59,7 @@ class SerialRelay:
                 
             # Try to open the port
             loop = asyncio.get_running_loop()
-            transport, protocol = await serial_asyncio.open_serial_connection(
+            reader, writer = await serial_asyncio.open_serial_connection(
                 url=self.serial_port, 
                 baudrate=self.baud
             )
@@ -55,7 +68,7 @@ class SerialRelay:
             # For now, we assume if we can open the port, it's our device
             
             # If we got here, connection successful
-            transport.close()
+            writer.close()
             return {
                 "connected": True,
                 "port": self.serial_port,
@@ -79,10 +92,13 @@ class SerialRelay:
             
         loop = asyncio.get_running_loop()
         try:
-            self.transport, self.protocol = await serial_asyncio.open_serial_connection(
+            self.reader, self.writer = await serial_asyncio.open_serial_connection(
                 url=self.serial_port, 
                 baudrate=self.baud
             )
+            # drain() then waits until the transport has handed every byte to
+            # the port, instead of returning while up to 64KB is still queued
+            self.writer.transport.set_write_buffer_limits(high=0)
             self._is_connected = True
             LOG.info("Connected to STM32 at %s @ %s", self.serial_port, self.baud)
         except Exception as e:
@@ -91,35 +107,57 @@ class SerialRelay:
             raise
 
     async def write(self, data: bytes):
-        if self.transport:
-            # Add validation bytes
-            validated_data = data + create_chunk_validator(data)
-            self.transport.write(validated_data)
+        if self.writer:
+            self.writer.write(data)
+            # Pace callers (and progress reporting) by the link, not by enqueueing
+            await self.writer.drain()
         else:
             LOG.debug("Simulated write: %r", data)
 
-    async def send_file(self, file_data: bytes, filename: str):
-        """Send a file to the STM32 in chunks"""
-        # Prepare the file for transfer
-        self.file_transfer.prepare_file(file_data, filename)
-        
-        # Send header first
-        header = self.file_transfer.get_header()
-        await self.write(header)
-        await asyncio.sleep(0.1)  # Give STM32 time to process
-
-        # Send chunks
-        while True:
-            chunk_data = self.file_transfer.get_next_chunk()
-            if chunk_data is None:
-                break
-                
-            chunk, chunk_num = chunk_data
-            await self.write(chunk)
-            LOG.info(f"Sent chunk {chunk_num}")
-            await asyncio.sleep(0.05)  # Rate limiting
-            
+    async def send_file(self, file_data: bytes, filename: str, publish=None) -> FileTransfer:
+        """Send a file to the STM32 in chunks.
+
+        If ``publish`` is given it receives coalesced ``transfer_progress``
+        events at a fixed rate (see progress.ProgressTracker). Uploads from
+        several clients are sent one after another. Returns the completed
+        ``FileTransfer``.
+        """
+        async with self._send_lock:
+            # Prepare the file for transfer
+            file_transfer = FileTransfer()
+            file_transfer.prepare_file(file_data, filename)
+
+            progress = None
+            if publish is not None:
+                progress = ProgressTracker(publish, file_transfer.size, filename)
+                progress.start()
+
+            ok = False
+            try:
+                # Send header first
+                header = file_transfer.get_header()
+                await self.write(header)
+                await asyncio.sleep(0.1)  # Give STM32 time to process
+
+                # Send chunks, prepared ahead of the writer off the event loop
+                pipeline = ChunkPipeline(file_transfer, self.executor, self.lookahead)
+                async with contextlib.aclosing(pipeline.chunks()) as chunks:
+                    async for chunk, chunk_num in chunks:
+                        await self.write(chunk)
+                        if progress is not None:
+                            progress.update(len(chunk) - CHUNK_HEADER_SIZE)
+                        LOG.debug("Sent chunk %d", chunk_num)
+                        await asyncio.sleep(0.05)  # Rate limiting
+
+                # Trailer carries the whole-file digest, hashed while chunking
+                await self.write(file_transfer.get_trailer())
+                ok = True
+            finally:
+                if progress is not None:
+                    await progress.finish(ok)
+
         LOG.info(f"File transfer complete: {filename}")
+        return file_transfer
 
 
 async def ws_handler(websocket, path, relay: SerialRelay):
@@ -153,16 +191,17 @@ async def ws_handler(websocket, path, relay: SerialRelay):
                     size = obj.get("size", 0)
                     data = obj.get("data", "")
                     
+                    async def publish_progress(event):
+                        await websocket.send(json.dumps(event))
+
                     try:
-                        # Convert base64 data to bytes and send to STM32
-                        if isinstance(data, str):
-                            import base64
-                            data = base64.b64decode(data.split(',')[1])
-                        await relay.write(data)
+                        # Stream the file to the STM32 chunk by chunk
+                        transfer = await relay.send_file(data, filename, publish=publish_progress)
                         await websocket.send(json.dumps({
                             "type": "upload_success",
                             "filename": filename,
-                            "size": len(data)
+                            "size": transfer.size,
+                            "digest": transfer.tree_hash.digest().hex()
                         }))
                     except Exception as e:
                         await websocket.send(json.dumps({
@@ -222,11 +261,16 @@ async def main():
     parser.add_argument("--ws-port", type=int, default=8765)
     parser.add_argument("--web-port", type=int, default=8000)
     parser.add_argument("--host", default="127.0.0.1", help="Host to bind to (default: 127.0.0.1)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes for chunk preparation (default: 0, use threads)")
+    parser.add_argument("--lookahead", type=int, default=LOOKAHEAD,
+                        help=f"Chunks prepared ahead of the writer (default: {LOOKAHEAD})")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
 
-    relay = SerialRelay(serial_port=args.port, baud=args.baud)
+    relay = SerialRelay(serial_port=args.port, baud=args.baud,
+                        workers=args.workers, lookahead=args.lookahead)
     await relay.connect()
 
     # Start web server for UI
@@ -240,6 +284,7 @@ async def main():
         try:
             await asyncio.Future()  # run forever
         finally:
+            relay.close()
             await web_runner.cleanup()
 
 
@@ -4,10 +4,13 @@ File transfer module for handling file data chunking and validation.
 import struct
 import logging
 import base64
+import hashlib
 
 LOG = logging.getLogger(__name__)
 
 CHUNK_SIZE = 16 * 1024  # 16KB chunks to match STM32 side
+CHUNK_HEADER_SIZE = 4  # Chunk number (2 bytes) + chunk size (2 bytes)
+TRAILER_MAGIC = b'\xAA\x5A'
 
 def create_chunk_validator():
     """Create a simple chunk validator function"""
@@ -15,6 +18,41 @@ def create_chunk_validator():
         return True  # Basic validation - can be enhanced with checksums
     return validate_chunk
 
+def frame_chunk(chunk_num: int, chunk_data: bytes) -> bytes:
+    """Prefix chunk data with its header"""
+    # Chunk header:
+    # - Chunk number (2 bytes)
+    # - Chunk size (2 bytes)
+    return struct.pack('>HH', chunk_num, len(chunk_data)) + bytes(chunk_data)
+
+def chunk_digest(chunk_data: bytes) -> bytes:
+    """SHA-256 of a chunk's payload (without its header)"""
+    return hashlib.sha256(chunk_data).digest()
+
+class TreeHash:
+    """Whole-file digest built from per-chunk digests.
+
+    The file digest is SHA-256 over the chunk digests in chunk order, so chunks
+    can be hashed as they are produced or received, in any order.
+    """
+    def __init__(self, total_chunks: int):
+        self.digests = [None] * total_chunks
+        self.remaining = total_chunks
+
+    def add(self, chunk_num: int, digest: bytes):
+        if self.digests[chunk_num] is None:
+            self.remaining -= 1
+        self.digests[chunk_num] = digest
+
+    @property
+    def complete(self) -> bool:
+        return self.remaining == 0
+
+    def digest(self) -> bytes:
+        if not self.complete:
+            raise RuntimeError(f"{self.remaining} chunks not hashed yet")
+        return hashlib.sha256(b''.join(self.digests)).digest()
+
 class FileTransfer:
     def __init__(self):
         self.data = None
@@ -22,6 +60,7 @@ class FileTransfer:
         self.size = 0
         self.current_chunk = 0
         self.total_chunks = 0
+        self.tree_hash = None
         self.validator = create_chunk_validator()
     
     def prepare_file(self, file_data: str, filename: str):
@@ -36,6 +75,7 @@ class FileTransfer:
         self.size = len(self.data)
         self.current_chunk = 0
         self.total_chunks = (self.size + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.tree_hash = TreeHash(self.total_chunks)
         
         LOG.info(f"Prepared file {filename} ({self.size} bytes, {self.total_chunks} chunks)")
     
@@ -54,28 +94,43 @@ class FileTransfer:
         header += self.filename.encode('utf-8')
         return header
     
+    def chunk_range(self, chunk_num: int) -> tuple[int, int]:
+        """Byte range of a chunk's payload within the file"""
+        start = chunk_num * CHUNK_SIZE
+        return start, min(start + CHUNK_SIZE, self.size)
+
+    def build_chunk(self, chunk_num: int, digest: bytes) -> bytes:
+        """Frame and validate a chunk whose payload digest is already known"""
+        start, end = self.chunk_range(chunk_num)
+        with memoryview(self.data)[start:end] as chunk_data:
+            chunk = frame_chunk(chunk_num, chunk_data)
+        self.tree_hash.add(chunk_num, digest)
+
+        # Validate chunk before sending
+        if not self.validator(chunk):
+            raise RuntimeError(f"Chunk {chunk_num} failed validation")
+
+        self.current_chunk = chunk_num + 1
+        return chunk
+
     def get_next_chunk(self) -> tuple[bytes, int]:
         """Get the next chunk of data to send"""
         if not self.data or self.current_chunk >= self.total_chunks:
             return None
-            
-        start = self.current_chunk * CHUNK_SIZE
-        end = min(start + CHUNK_SIZE, self.size)
-        chunk_data = self.data[start:end]
-        
-        # Add chunk header:
-        # - Chunk number (2 bytes)
-        # - Chunk size (2 bytes)
-        chunk_header = struct.pack('>HH', self.current_chunk, len(chunk_data))
-        
-        # Combine header and data
-        chunk = chunk_header + chunk_data
-        
-        # Validate chunk before sending
-        if not self.validator(chunk):
-            raise RuntimeError(f"Chunk {self.current_chunk} failed validation")
-            
+
         chunk_num = self.current_chunk
-        self.current_chunk += 1
-        
-        return chunk, chunk_num
\ No newline at end of file
+        start, end = self.chunk_range(chunk_num)
+        with memoryview(self.data)[start:end] as chunk_data:
+            digest = chunk_digest(chunk_data)
+        return self.build_chunk(chunk_num, digest), chunk_num
+
+    def get_trailer(self) -> bytes:
+        """Generate file transfer trailer, sent after the last chunk"""
+        # Trailer format:
+        # - Magic bytes (2 bytes): 0xAA 0x5A
+        # - Chunk count (2 bytes)
+        # - File digest (32 bytes), see TreeHash
+        if not self.data:
+            raise RuntimeError("No file prepared for transfer")
+
+        return struct.pack('>2sH32s', TRAILER_MAGIC, self.total_chunks, self.tree_hash.digest())
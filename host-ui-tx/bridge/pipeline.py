@@ -0,0 +1,121 @@
+"""
+Chunk preparation pipeline that runs ahead of the serial writer.
+
+The per-chunk CPU work (currently hashing) runs on an executor up to
+``lookahead`` steps ahead of the chunk currently being written, and chunks are
+handed back to the writer in order. With a thread pool the workers read the
+file buffer directly; with a process pool the file is placed in shared memory
+once and workers attach to it by name. Either way only offsets go to a worker
+and only its digest comes back; framing happens on the writer side from the
+original buffer.
+"""
+import asyncio
+import functools
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from file_transfer import chunk_digest
+
+LOG = logging.getLogger(__name__)
+
+LOOKAHEAD = 4  # Chunks prepared ahead of the writer
+
+# Worker-side attachment to the shared buffer of the current transfer
+_worker_shm = None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    global _worker_shm
+    if _worker_shm is None or _worker_shm.name != name:
+        _detach()
+        _worker_shm = shared_memory.SharedMemory(name=name)
+    return _worker_shm
+
+
+def _detach():
+    global _worker_shm
+    if _worker_shm is not None:
+        _worker_shm.close()
+        _worker_shm = None
+
+
+def _fill(buf, data: bytes):
+    buf[:len(data)] = data
+
+
+def prepare_chunk(buf, start: int, end: int) -> bytes:
+    """Per-chunk work done off the event loop. Runs on a worker thread."""
+    with buf[start:end] as chunk_data:
+        return chunk_digest(chunk_data)
+
+
+def _prepare_shared(name: str, start: int, end: int, size: int) -> bytes:
+    """Same as prepare_chunk, reading from shared memory. Runs in a worker process."""
+    try:
+        return prepare_chunk(_attach(name).buf, start, end)
+    finally:
+        # Don't keep the finished transfer's buffer mapped until the next one
+        if end == size:
+            _detach()
+
+
+class ChunkPipeline:
+    def __init__(self, file_transfer, executor=None, lookahead: int = LOOKAHEAD):
+        """Prepare the chunks of a prepared ``FileTransfer`` on ``executor``.
+
+        ``executor`` may be a thread pool, a process pool, or None for the
+        loop's default executor.
+        """
+        if lookahead < 1:
+            raise ValueError("lookahead must be at least 1")
+        self.file_transfer = file_transfer
+        self.executor = executor
+        self.lookahead = lookahead
+
+    async def chunks(self):
+        """Yield ``(chunk, chunk_num)`` in order, like ``FileTransfer.get_next_chunk``."""
+        ft = self.file_transfer
+        if not ft.data:
+            raise RuntimeError("No file prepared for transfer")
+
+        loop = asyncio.get_running_loop()
+        shm = copy = buf = None
+        pending = deque()
+        next_num = ft.current_chunk
+        try:
+            if isinstance(self.executor, ProcessPoolExecutor):
+                shm = shared_memory.SharedMemory(create=True, size=ft.size)
+                # Copying a large file would stall the event loop; shielded so
+                # a cancelled transfer still lets the copy finish before close()
+                copy = loop.run_in_executor(None, _fill, shm.buf, ft.data)
+                await asyncio.shield(copy)
+                work, buf = functools.partial(_prepare_shared, size=ft.size), shm.name
+            else:
+                work, buf = prepare_chunk, memoryview(ft.data)
+
+            while pending or next_num < ft.total_chunks:
+                # Keep up to `lookahead` chunks in flight
+                while next_num < ft.total_chunks and len(pending) < self.lookahead:
+                    start, end = ft.chunk_range(next_num)
+                    pending.append((next_num, loop.run_in_executor(
+                        self.executor, work, buf, start, end)))
+                    next_num += 1
+
+                chunk_num, future = pending.popleft()
+                digest = await future
+                yield ft.build_chunk(chunk_num, digest), chunk_num
+        finally:
+            # Drop chunks not started yet. Ones already running are not waited
+            # for; a worker's mapping stays valid after the unlink below, and
+            # its digest is simply discarded.
+            for _, future in pending:
+                future.cancel()
+            if shm is not None:
+                if copy is not None:
+                    await asyncio.wait([copy])
+                shm.close()
+                shm.unlink()
+            elif isinstance(buf, memoryview):
+                buf.release()
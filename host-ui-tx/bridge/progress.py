@@ -0,0 +1,130 @@
+"""
+Transfer progress reporting with a fixed publish rate.
+
+The chunk loop only bumps a byte counter and notes when it did so; a separate
+task samples that counter at a fixed rate and publishes one coalesced event per
+tick, so reporting cost does not depend on chunk size or count.
+"""
+import asyncio
+import logging
+import math
+import time
+
+LOG = logging.getLogger(__name__)
+
+PUBLISH_RATE_HZ = 10
+SMOOTHING_TAU_S = 3.0  # Time constant of the throughput EWMA, in seconds
+
+
+class ProgressTracker:
+    def __init__(self, publish, total_bytes: int, filename: str = "",
+                 rate_hz: float = PUBLISH_RATE_HZ, tau: float = SMOOTHING_TAU_S,
+                 clock=time.monotonic):
+        """Track a transfer and call ``publish(event)`` at most ``rate_hz`` times per second.
+
+        ``publish`` is an async callable receiving a dict (see ``snapshot``).
+        """
+        self.publish = publish
+        self.total_bytes = total_bytes
+        self.filename = filename
+        self.interval = 1.0 / rate_hz
+        self.tau = tau
+        self.clock = clock
+        self.bytes_done = 0
+        self.instant_bps = 0.0
+        self.smoothed_bps = None
+        self._started = clock()
+        self._updated = self._started  # When bytes_done last changed
+        self._sampled_time = self._started  # When bytes_done last changed as of the previous sample
+        self._sampled_bytes = 0
+        self._published_bytes = None
+        self._task = None
+
+    def update(self, nbytes: int):
+        """Record ``nbytes`` more bytes sent. Cheap enough to call per chunk."""
+        self.bytes_done += nbytes
+        self._updated = self.clock()
+
+    def start(self):
+        """Start the publisher task on the running loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def tick(self):
+        """Publish one coalesced event if anything moved. Called by the publisher task."""
+        self._sample()
+        await self._emit()
+
+    async def finish(self, ok: bool = True):
+        """Stop the publisher and send a final event reflecting the end state.
+
+        ``ok`` tells the UI whether the transfer completed or failed.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._sample()
+        await self._emit(done=True, ok=ok)
+
+    def _sample(self):
+        """Fold bytes sent since the previous sample into the throughput figures.
+
+        Rates are measured between the times the byte count changed, not per
+        tick, so chunks slower than the tick rate are neither over-counted in
+        the tick they land in nor diluted by the empty ticks between them.
+        """
+        if self.bytes_done == self._sampled_bytes:
+            return
+        dt = self._updated - self._sampled_time
+        if dt <= 0:
+            return
+        self.instant_bps = (self.bytes_done - self._sampled_bytes) / dt
+        if self.smoothed_bps is None:
+            self.smoothed_bps = self.instant_bps
+        else:
+            alpha = 1.0 - math.exp(-dt / self.tau)
+            self.smoothed_bps += alpha * (self.instant_bps - self.smoothed_bps)
+        self._sampled_time = self._updated
+        self._sampled_bytes = self.bytes_done
+
+    def snapshot(self, done: bool = False, ok: bool = True) -> dict:
+        """Current progress as a ``transfer_progress`` message."""
+        remaining = max(self.total_bytes - self.bytes_done, 0)
+        if done and not ok:
+            eta = None
+        elif done or remaining == 0:
+            eta = 0.0
+        elif self.smoothed_bps:
+            eta = remaining / self.smoothed_bps
+        else:
+            eta = None
+        return {
+            "type": "transfer_progress",
+            "filename": self.filename,
+            "bytes_done": self.bytes_done,
+            "total_bytes": self.total_bytes,
+            "instant_bps": round(self.instant_bps, 1),
+            "smoothed_bps": round(self.smoothed_bps or 0.0, 1),
+            "eta_s": None if eta is None else round(eta, 2),
+            "elapsed_s": round(self.clock() - self._started, 2),
+            "done": done,
+            "ok": ok,
+        }
+
+    async def _emit(self, done: bool = False, ok: bool = True):
+        # Skip ticks where nothing moved, except for the final event
+        if not done and self.bytes_done == self._published_bytes:
+            return
+        self._published_bytes = self.bytes_done
+        try:
+            await self.publish(self.snapshot(done, ok))
+        except Exception as e:
+            LOG.debug("Progress publish failed: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.tick()
@@ -0,0 +1,107 @@
+import asyncio
+
+from progress import ProgressTracker
+
+CHUNK = 16 * 1024
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_ticks(tracker, clock, seconds, on_tick=None):
+    """Advance the fake clock tick by tick, calling tracker.tick() at each one."""
+    async def go():
+        for i in range(1, round(seconds / tracker.interval) + 1):
+            clock.now = i * tracker.interval
+            if on_tick is not None:
+                on_tick(clock.now)
+            await tracker.tick()
+    asyncio.run(go())
+
+
+def make_tracker(total_bytes):
+    clock = FakeClock()
+    events = []
+
+    async def publish(event):
+        events.append(event)
+
+    return ProgressTracker(publish, total_bytes, "f.bin", clock=clock), clock, events
+
+
+def test_updates_between_ticks_are_coalesced():
+    tracker, clock, events = make_tracker(1000 * 64)
+
+    # 100 tiny chunks per tick, ten ticks per second
+    run_ticks(tracker, clock, 1.0, lambda now: [tracker.update(64) for _ in range(100)])
+
+    assert len(events) <= 10
+    assert events[-1]["bytes_done"] == 1000 * 64
+
+
+def test_eta_with_chunks_slower_than_tick():
+    # 115200 baud moves a 16KB chunk about every 1.47s, i.e. every ~15 ticks
+    period = 1.47
+    tracker, clock, events = make_tracker(8 * CHUNK)
+    sent = []
+
+    def send(now):
+        if now >= period * (len(sent) + 1) and len(sent) < 8:
+            sent.append(now)
+            tracker.update(CHUNK)
+
+    run_ticks(tracker, clock, 12.0, send)
+
+    # Apart from the initial 0% event, only ticks where a chunk landed are published
+    assert [e["bytes_done"] for e in events] == [CHUNK * n for n in range(9)]
+    for event in events[1:]:
+        assert abs(event["smoothed_bps"] - CHUNK / period) < 0.1 * CHUNK / period
+        remaining = (8 * CHUNK - event["bytes_done"]) / CHUNK * period
+        assert abs(event["eta_s"] - remaining) <= 0.15 * remaining + 0.2
+
+
+def test_final_event_reports_outcome_without_spike():
+    tracker, clock, events = make_tracker(2 * CHUNK)
+    run_ticks(tracker, clock, 2.0, lambda now: tracker.update(CHUNK) if now in (0.5, 1.0) else None)
+    clock.now = 2.05
+    asyncio.run(tracker.finish())
+
+    final = events[-1]
+    assert final["done"] and final["ok"]
+    assert final["eta_s"] == 0.0
+    assert final["instant_bps"] == events[-2]["instant_bps"]
+
+
+def test_failed_transfer_is_not_ok():
+    tracker, clock, events = make_tracker(2 * CHUNK)
+    tracker.update(CHUNK)
+    clock.now = 0.3
+    asyncio.run(tracker.finish(ok=False))
+
+    assert events[-1]["done"] and not events[-1]["ok"]
+    assert events[-1]["eta_s"] is None
+
+
+def test_publisher_task_respects_rate():
+    events = []
+
+    async def publish(event):
+        events.append(event)
+
+    async def go():
+        tracker = ProgressTracker(publish, 10 ** 9, rate_hz=20)
+        tracker.start()
+        for _ in range(300):
+            tracker.update(1)
+            await asyncio.sleep(0.001)
+        await tracker.finish()
+        return tracker
+
+    asyncio.run(go())
+    elapsed = events[-1]["elapsed_s"]
+    assert len(events) <= elapsed * 20 + 2
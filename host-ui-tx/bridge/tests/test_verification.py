@@ -0,0 +1,119 @@
+import asyncio
+import base64
+import contextlib
+import importlib.util
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from file_transfer import CHUNK_SIZE, FileTransfer
+from pipeline import ChunkPipeline
+
+# The RX bridge has its own file_transfer module; load it under another name
+_RX_PATH = Path(__file__).resolve().parents[3] / "host-ui-rx" / "bridge" / "file_transfer.py"
+_spec = importlib.util.spec_from_file_location("rx_file_transfer", _RX_PATH)
+rx = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(rx)
+
+DATA = random.Random(0).randbytes(5 * CHUNK_SIZE + 1234)
+
+
+def prepared():
+    ft = FileTransfer()
+    ft.prepare_file(base64.b64encode(DATA).decode(), "x.bin")
+    return ft
+
+
+def sequential():
+    ft = prepared()
+    chunks = []
+    while (chunk := ft.get_next_chunk()) is not None:
+        chunks.append(chunk[0])
+    return ft.get_header(), chunks, ft.get_trailer()
+
+
+def pipelined(executor):
+    async def go():
+        ft = prepared()
+        pipeline = ChunkPipeline(ft, executor, lookahead=3)
+        async with contextlib.aclosing(pipeline.chunks()) as chunks:
+            sent = [chunk async for chunk, _ in chunks]
+        return sent, ft.get_trailer()
+    return asyncio.run(go())
+
+
+def receiver(tmp_path, header):
+    r = rx.FileReceiver(str(tmp_path))
+    r.start(header)
+    return r
+
+
+@pytest.mark.parametrize("pool", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_pipeline_matches_sequential_chunking(pool):
+    _, chunks, trailer = sequential()
+    with pool(max_workers=2) as executor:
+        assert pipelined(executor) == (chunks, trailer)
+
+
+def test_out_of_order_round_trip_with_early_trailer(tmp_path):
+    header, chunks, trailer = sequential()
+    r = receiver(tmp_path, header)
+
+    # Trailer first, then chunks shuffled; the result is known on the last one
+    assert r.finish(trailer) is None
+    shuffled = chunks[:]
+    random.Random(1).shuffle(shuffled)
+    results = [r.write_chunk(chunk) for chunk in shuffled]
+
+    assert results == [None] * (len(chunks) - 1) + [True]
+    assert (tmp_path / "x.bin").read_bytes() == DATA
+
+
+def test_corrupted_chunk_fails_verification(tmp_path):
+    header, chunks, trailer = sequential()
+    r = receiver(tmp_path, header)
+    bad = bytearray(chunks[2])
+    bad[100] ^= 0x01
+    chunks[2] = bytes(bad)
+
+    for chunk in chunks:
+        r.write_chunk(chunk)
+    assert r.finish(trailer) is False
+
+
+def test_duplicate_and_late_chunks_are_ignored(tmp_path):
+    header, chunks, trailer = sequential()
+    r = receiver(tmp_path, header)
+
+    r.write_chunk(chunks[0])
+    # A corrupted retransmission of a chunk already written must not count
+    bad = bytearray(chunks[0])
+    bad[-1] ^= 0x01
+    assert r.write_chunk(bytes(bad)) is None
+    for chunk in chunks[1:]:
+        r.write_chunk(chunk)
+    assert r.finish(trailer) is True
+
+    # A late resend after verification returns the result without writing
+    assert r.write_chunk(chunks[-1]) is True
+    assert (tmp_path / "x.bin").read_bytes() == DATA
+
+
+def test_malformed_frames_are_rejected(tmp_path):
+    header, chunks, _ = sequential()
+
+    with pytest.raises(ValueError):
+        rx.FileReceiver(str(tmp_path)).write_chunk(chunks[0])
+
+    r = receiver(tmp_path, header)
+    with pytest.raises(ValueError):
+        r.write_chunk(chunks[0][:2])
+    with pytest.raises(ValueError):
+        r.write_chunk(chunks[0][:-1])
+    oversized = chunks[0][:2] + (CHUNK_SIZE + 1).to_bytes(2, "big") + chunks[0][4:] + b"\x00"
+    with pytest.raises(ValueError):
+        r.write_chunk(oversized)
+    r.file.close()
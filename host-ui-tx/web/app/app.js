@@ -52,6 +52,28 @@
     statusModal.classList.remove('show');
   }
 
+  function formatBytes(n) {
+    if (n >= 1024 * 1024) return (n / (1024 * 1024)).toFixed(1) + 'MB';
+    if (n >= 1024) return (n / 1024).toFixed(1) + 'KB';
+    return n + 'B';
+  }
+
+  // Render a coalesced transfer_progress event from the bridge
+  function showProgress(p) {
+    if (p.done && !p.ok) {
+      // The error message that follows resets the form
+      showModal(`Sending ${p.filename} failed`, false);
+      return;
+    }
+    const pct = p.total_bytes ? Math.floor(100 * p.bytes_done / p.total_bytes) : 100;
+    let text = `Sending ${p.filename}: ${pct}% (${formatBytes(p.bytes_done)} / ${formatBytes(p.total_bytes)})`;
+    text += ` at ${formatBytes(p.smoothed_bps)}/s`;
+    if (p.eta_s !== null && !p.done) {
+      text += `, ${Math.ceil(p.eta_s)}s left`;
+    }
+    showModal(text, !p.done);
+  }
+
   // Update the connection status display
   function updateConnectionStatus(status, isError = false) {
     connectionStatus.textContent = status;
@@ -105,10 +127,21 @@
               updateConnectionIndicator(false, errorMsg);
               reject(errorMsg);
             }
+          } else if (response.type === 'transfer_progress') {
+            showProgress(response);
           } else if (response.type === 'upload_success') {
             updateConnectionStatus('File sent to STM32', false);
+            fileInput.value = '';
+            fileInfo.textContent = 'File sent successfully';
+            showModal('File sent successfully!', false);
+            setTimeout(hideModal, 2000);
           } else if (response.type === 'error') {
             updateConnectionStatus(response.message, true);
+            hideModal();
+            fileInfo.textContent = response.message;
+            fileInfo.style.color = '#ff4d4f';
+            // Keep the selected file so the upload can be retried
+            sendDataBtn.disabled = !fileInput.files[0];
             reject(response.message);
           }
         } catch (e) {
@@ -136,11 +169,11 @@
     });
   }
 
-  async function sendMessage(obj) {
+  async function sendMessage(obj, raw = true) {
     try {
       updateConnectionStatus('Connecting to device...', true);
       await connectToDevice();
-      const envelope = { type: 'raw', data: JSON.stringify(obj) };
+      const envelope = raw ? { type: 'raw', data: JSON.stringify(obj) } : obj;
       ws.send(JSON.stringify(envelope));
       updateConnectionStatus('Device connected', false);
       return true;
@@ -205,14 +238,14 @@
           data: data
         };
 
-        const sent = await sendMessage(message);
+        // Sent as-is so the bridge streams it in chunks and reports progress
+        const sent = await sendMessage(message, false);
         if (sent) {
-          // Reset the file input
-          fileInput.value = '';
-          fileInfo.textContent = 'File sent successfully';
+          // Completion arrives as upload_success, failure as error
+          fileInfo.textContent = 'Sending file...';
+          fileInfo.style.color = 'var(--muted)';
           sendDataBtn.disabled = true;
-          showModal('File sent successfully!', false);
-          setTimeout(hideModal, 2000);
+          showModal(`Sending ${file.name}...`);
         }
       };
       reader.readAsDataURL(file);